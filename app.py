@@ -1,7 +1,19 @@
+import io
+import re
+import threading
+
 import streamlit as st
-import matplotlib.pyplot as plt
-from lsystem import derivation, generate_coordinates, SYSTEM_RULES
-import concurrent.futures
+import numpy as np
+from lsystem import derivation, generate_polylines, predicted_length, SYSTEM_RULES
+from collections import Counter
+
+# matplotlib is imported lazily inside the plotting path: Streamlit reruns
+# this module on every widget event, and reruns that only touch the sidebar
+# shouldn't pay for the plotting stack.
+
+# Longest sequence the app will derive and draw; beyond this the plot is a
+# solid blob anyway and derivation time grows without bound.
+MAX_SEQUENCE_LENGTH = 5_000_000
 
 # Title and Description
 st.title("2D L-System Fractal Generator")
@@ -17,56 +29,64 @@ iterations = st.sidebar.slider("Iterations", min_value=1, max_value=10, value=5)
 initial_heading = st.sidebar.number_input("Initial Heading (degrees)", min_value=0, max_value=360, value=0)
 angle_increment = st.sidebar.number_input("Angle Increment", min_value=0, max_value=360, value=120)
 
-# Process rules input into SYSTEM_RULES
+# Process rules input into SYSTEM_RULES with a single compiled-regex scan.
+# The right-hand side may be empty (an erasing rule), so it matches with .*?
+# and only horizontal whitespace may sit between the arrow and the line end —
+# otherwise an empty RHS would swallow the next line.
+_RULE_RE = re.compile(r"^\s*(\S+)\s*->[ \t]*(.*?)[ \t\r]*$", re.MULTILINE)
 SYSTEM_RULES.clear()
-for line in rules_input.splitlines():
-    if "->" in line:
-        key, value = map(str.strip, line.split("->"))
-        SYSTEM_RULES[key] = value
+SYSTEM_RULES.update(_RULE_RE.findall(rules_input))
+
+
+def single_rule_complexity(rule_text, num_iterations, angle_measure):
+    # One Counter pass gives every metric instead of five separate scans.
+    symbol_counts = Counter(rule_text)
+    length = len(rule_text)
+    unique_symbols = len(symbol_counts)
+    rotations = symbol_counts['+'] + symbol_counts['-']
+    branches = symbol_counts['['] + symbol_counts[']']
+    variables = sum(count for symbol, count in symbol_counts.items() if symbol.isalpha())
 
+    weights = {
+        'length': 0.5,
+        'unique': 1.0,
+        'rotation': 1.5,
+        'branch': 2.0,
+        'variable': 1.0,
+        'angle': 0.02
+    }
 
-def calculate_rule_complexity(rules_data, num_iterations=1, angle_measure=0):
+    base_complexity = (
+        length * weights['length'] +
+        unique_symbols * weights['unique'] +
+        rotations * weights['rotation'] +
+        branches * weights['branch'] +
+        variables * weights['variable'] +
+        angle_measure * weights['angle']
+    )
+
+    iteration_factor = 1 + (num_iterations * 0.5)
+    return base_complexity * iteration_factor
+
+
+@st.cache_data(max_entries=32)
+def calculate_rule_complexity(rules_items, num_iterations=1, angle_measure=0):
     """
     Calculate complexity metrics for L-system rules, including angle_increment.
+    Takes the rules as a sorted tuple of items so results cache across reruns.
     """
-    def single_rule_complexity(rule_text):
-        length = len(rule_text)
-        unique_symbols = len(set(rule_text))
-        rotations = rule_text.count('+') + rule_text.count('-')
-        branches = rule_text.count('[') + rule_text.count(']')
-        variables = sum(1 for c in rule_text if c.isalpha())
-
-        weights = {
-            'length': 0.5,
-            'unique': 1.0,
-            'rotation': 1.5,
-            'branch': 2.0,
-            'variable': 1.0,
-            'angle': 0.02
-        }
-
-        base_complexity = (
-            length * weights['length'] +
-            unique_symbols * weights['unique'] +
-            rotations * weights['rotation'] +
-            branches * weights['branch'] +
-            variables * weights['variable'] +
-            angle_measure * weights['angle']
-        )
-
-        iteration_factor = 1 + (num_iterations * 0.5)
-        return base_complexity * iteration_factor
-
-    individual_complexity_scores = {var: single_rule_complexity(rule) for var, rule in rules_data.items()}
+    individual_complexity_scores = {
+        var: single_rule_complexity(rule, num_iterations, angle_measure) for var, rule in rules_items
+    }
     total_complexity_score = sum(individual_complexity_scores.values())
-    average_complexity = total_complexity_score / len(rules_data) if rules_data else 0
+    average_complexity = total_complexity_score / len(rules_items) if rules_items else 0
 
     return total_complexity_score, average_complexity, individual_complexity_scores
 
 
 # Display rule complexity in real-time
 total_complexity, avg_complexity, individual_complexities = calculate_rule_complexity(
-    SYSTEM_RULES, iterations, angle_increment
+    tuple(sorted(SYSTEM_RULES.items())), iterations, angle_increment
 )
 st.sidebar.subheader("Rule Complexity Metrics")
 st.sidebar.markdown(f"""
@@ -77,33 +97,168 @@ Individual Rule Complexities:
 """)
 
 
-# Function to safely run derivation with timeout
-def safe_derivation(start_axiom, steps, timeout=5):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(derivation, start_axiom, steps)
-        try:
-            return future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            st.warning("Generation took too long and was stopped. Try reducing iterations or simplifying the rules.")
-            return None
+# Cached wrappers so unrelated widget changes don't re-run the expensive steps.
+# Rules are passed as a sorted tuple of items to give Streamlit a hashable key.
+@st.cache_data(max_entries=32)
+def derive_cached(axiom, steps, rules_items):
+    return derivation(axiom, steps, dict(rules_items), max_len=MAX_SEQUENCE_LENGTH)
+
+
+@st.cache_data(max_entries=32)
+def polylines_cached(sequence, seg_length, initial_heading, angle_increment):
+    return generate_polylines(sequence, seg_length, initial_heading, angle_increment)
+
+
+# Function to safely run derivation, warning instead of raising on oversize
+def safe_derivation(start_axiom, steps, rules_items):
+    try:
+        return derive_cached(start_axiom, steps, rules_items)
+    except ValueError as error:
+        st.warning(str(error))
+        return None
 
 
 # Plotting function
-def plot_l_system(plt_coordinates):
-    figure, axis = plt.subplots(figsize=(3.5, 3.5))
-    axis.plot(*zip(*plt_coordinates), lw=0.3, color="forestgreen")
-    axis.axis("equal")
-    axis.axis("off")
-    return figure
+# One figure reused for every render, built on a raw Agg canvas: going
+# through pyplot would drag in its figure registry and interactive state
+# machinery that a server-rendered app never uses. st.cache_resource shares
+# this figure across all sessions, so every draw happens under its lock and
+# only serialized PNG bytes ever leave the function.
+@st.cache_resource
+def get_figure():
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    # Cheap path simplification: at fractal point counts most segments are
+    # sub-pixel, so let the Agg renderer collapse them before stroking.
+    matplotlib.rcParams["path.simplify"] = True
+    matplotlib.rcParams["path.simplify_threshold"] = 1.0
+    figure = Figure(figsize=(3.5, 3.5))
+    FigureCanvasAgg(figure)
+    return figure, figure.subplots(), threading.Lock()
+
+
+# Above this many points, vector plotting buys nothing at a ~350 px output
+# size; rasterizing a density image decouples render cost from depth.
+RASTER_POINT_THRESHOLD = 200_000
+
+
+def rasterize_l_system(polylines, size=700):
+    """Accumulates the drawn segments into a grayscale density image.
+
+    Most segments are sub-pixel at these point counts, but run-collapsed
+    trunks and branches can span many pixels, so each segment is sampled at
+    pixel pitch before binning: every pixel a segment crosses gets a hit,
+    at a cost of O(total inked pixels) regardless of depth.
+    """
+    points = np.concatenate(polylines)
+    mins = points.min(axis=0)
+    span = max((points.max(axis=0) - mins).max(), 1e-9)
+    scale = (size - 1) / span
+    starts = (np.concatenate([line[:-1] for line in polylines]) - mins) * scale
+    ends = (np.concatenate([line[1:] for line in polylines]) - mins) * scale
+    deltas = ends - starts
+    # One sample per pixel of segment extent keeps adjacent samples under a
+    # pixel apart; sub-pixel segments contribute their start point only.
+    samples = np.maximum(np.ceil(np.abs(deltas).max(axis=1)).astype(np.int64), 1)
+    steps = np.repeat(deltas / samples[:, None], samples, axis=0)
+    ramp = np.arange(samples.sum()) - np.repeat(np.cumsum(samples) - samples, samples)
+    sampled = np.repeat(starts, samples, axis=0) + steps * ramp[:, None]
+    # The ramps exclude each segment's endpoint; binning the original points
+    # as well covers polyline tails.
+    sampled = np.concatenate([sampled, (points - mins) * scale])
+    scaled = sampled.astype(np.int32)
+    image = np.zeros((size, size), dtype=np.float32)
+    np.add.at(image, (size - 1 - scaled[:, 1], scaled[:, 0]), 1.0)
+    # Saturate density at 3 hits per pixel and invert: white background,
+    # darker where the curve folds over itself.
+    return (255 * (1 - np.minimum(image, 3) / 3)).astype(np.uint8)
+
+
+def decimate_polylines(polylines, size_px=350.0, min_points=5000):
+    """Drops points that land on the same output pixel as their predecessor.
+
+    At the figure's ~350 px drawing size, runs of sub-pixel segments stroke
+    the same pixel repeatedly; snapping to the pixel grid and keeping only
+    points that move changes nothing visibly while shrinking what the
+    renderer has to stroke.
+    """
+    # Valid rule sets can draw nothing (no F/G/R/L reachable): nothing to snap.
+    if not polylines:
+        return polylines
+    points = np.concatenate(polylines)
+    if len(points) < min_points:
+        return polylines
+    span = max((points.max(axis=0) - points.min(axis=0)).max(), 1e-9)
+    scale = size_px / span
+    decimated = []
+    for line in polylines:
+        snapped = np.round(line * scale).astype(np.int32)
+        keep = np.empty(len(line), dtype=bool)
+        keep[0] = True
+        keep[1:] = np.any(np.diff(snapped, axis=0) != 0, axis=1)
+        if keep.sum() > 1:
+            decimated.append(line[keep])
+    return decimated or polylines
+
+
+def plot_l_system(polylines):
+    """Draws the polylines and returns the render as PNG bytes.
+
+    The figure and Agg canvas are shared across sessions, so the draw runs
+    under the shared lock and only the serialized PNG escapes — session state
+    must never hold the live figure, or a rerun in one session would display
+    (and race with) another session's plot.
+    """
+    from matplotlib.collections import LineCollection
+
+    figure, axis, lock = get_figure()
+    with lock:
+        axis.clear()
+        polylines = decimate_polylines(polylines)
+        # LineCollection takes the polylines as-is — no exploding into
+        # (M, 2, 2) segment triples, which doubled every shared endpoint.
+        axis.add_collection(
+            LineCollection(polylines, linewidths=0.3, colors="forestgreen",
+                           antialiased=False, rasterized=True)
+        )
+        axis.autoscale_view()
+        axis.set_aspect("equal")
+        axis.axis("off")
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png", dpi=200)
+    return buffer.getvalue()
+
+
+def display_render(render):
+    # PNG bytes from the figure path or a grayscale array from the raster
+    # path; st.image renders either.
+    st.image(render, width=350)
 
 
 # Generate and display the L-System fractal
 if st.sidebar.button("Generate L-System"):
-    l_system_sequence = safe_derivation(axiom_input, iterations)
-    if l_system_sequence:
-        plot_coordinates = generate_coordinates(l_system_sequence, 1, initial_heading, angle_increment)
-        l_system_figure = plot_l_system(plot_coordinates)
-        st.pyplot(l_system_figure, use_container_width=False)
+    # Short-circuit repeated clicks with unchanged inputs: reuse the figure
+    # from session state instead of re-running the whole pipeline.
+    inputs_key = (axiom_input, rules_input, iterations, initial_heading, angle_increment)
+    if st.session_state.get("last_inputs") == inputs_key and "last_render" in st.session_state:
+        display_render(st.session_state["last_render"])
+    elif predicted_length(axiom_input, iterations, SYSTEM_RULES) > MAX_SEQUENCE_LENGTH:
+        # The growth matrix predicts the final size in closed form, so
+        # runaway configurations are rejected before any expansion runs.
+        st.warning("These rules would expand past the size limit. Try reducing iterations or simplifying the rules.")
+    else:
+        l_system_sequence = safe_derivation(axiom_input, iterations, tuple(sorted(SYSTEM_RULES.items())))
+        if l_system_sequence:
+            plot_polylines = polylines_cached(l_system_sequence, 1, initial_heading, angle_increment)
+            if sum(len(line) for line in plot_polylines) > RASTER_POINT_THRESHOLD:
+                render = rasterize_l_system(plot_polylines)
+            else:
+                render = plot_l_system(plot_polylines)
+            st.session_state["last_inputs"] = inputs_key
+            st.session_state["last_render"] = render
+            display_render(render)
 
 # Footer in Sidebar with smaller GitHub link
 st.sidebar.markdown("""
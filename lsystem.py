@@ -1,10 +1,28 @@
 import sys
 import math
-import matplotlib.pyplot as plt
+from itertools import groupby
+
+import numpy as np
+
+# matplotlib is only needed by the CLI's plot step; importing it lazily in
+# plot_l_system keeps app.py's `from lsystem import ...` (re-run by Streamlit
+# on startup) from paying the ~300 ms pyplot import.
+
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
 
 # Global dictionary to store L-System rules
 SYSTEM_RULES = {}
 
+# Heading/angle inputs are whole degrees in the common case, so every heading
+# the turtle can reach lives in a 360-entry table and the trig per position
+# becomes a gather instead of a transcendental evaluation.
+_COS_DEG = np.cos(np.deg2rad(np.arange(360)))
+_SIN_DEG = np.sin(np.deg2rad(np.arange(360)))
+
 
 def get_system_rules():
     """Collects user input rules for the L-System."""
@@ -22,12 +40,310 @@ def get_system_rules():
     return SYSTEM_RULES
 
 
-def derivation(axiom, steps):
-    """Generates an L-System sequence for a given axiom and number of steps."""
-    derived = axiom
+def _rule_table(rules):
+    """Builds a 256-entry table mapping each byte value to its expansion bytes.
+
+    Symbols without a rule map to themselves; an empty expansion is a valid
+    rule that erases its symbol. Raises UnicodeEncodeError if any rule symbol
+    or expansion is non-ASCII.
+    """
+    table = []
+    for code in range(256):
+        rule = rules.get(chr(code))
+        table.append(bytes([code]) if rule is None else rule.encode("ascii"))
+    return table
+
+
+def _flatten_table(table):
+    """Flattens a byte-expansion table into (offsets, lengths, expansions)
+    arrays for the compiled kernel: expansions holds every expansion back to
+    back and offsets/lengths index it by byte value."""
+    lengths = np.array([len(expansion) for expansion in table], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths[:-1])))
+    return offsets, lengths, np.frombuffer(b"".join(table), dtype=np.uint8)
+
+
+if _HAVE_NUMBA:
+    @njit(cache=True)
+    def _derive_kernel(buf, offsets, lengths, expansions, steps):
+        for _ in range(steps):
+            total = 0
+            for i in range(buf.size):
+                total += lengths[buf[i]]
+            out = np.empty(total, dtype=np.uint8)
+            pos = 0
+            for i in range(buf.size):
+                code = buf[i]
+                offset = offsets[code]
+                for j in range(lengths[code]):
+                    out[pos + j] = expansions[offset + j]
+                pos += lengths[code]
+            buf = out
+        return buf
+
+    @njit(cache=True)
+    def _walk_kernel(codes, seg_length, initial_heading, angle_increment, coordinates, stack, breaks):
+        # The heading is kept as a unit vector rotated incrementally by the
+        # precomputed (ca, sa) of the angle increment, so the loop body has
+        # no trig at all; renormalize occasionally to cancel rounding drift.
+        # Each "]" records the index of its restored point in breaks, so the
+        # caller can split the coordinates into pen-down polylines.
+        x = 0.0
+        y = 0.0
+        hx = math.cos(math.radians(initial_heading))
+        hy = math.sin(math.radians(initial_heading))
+        ca = math.cos(math.radians(angle_increment))
+        sa = math.sin(math.radians(angle_increment))
+        coordinates[0, 0] = x
+        coordinates[0, 1] = y
+        index = 1
+        sp = 0
+        n_breaks = 0
+        rotations = 0
+        for i in range(codes.size):
+            code = codes[i]
+            if code == 70 or code == 71 or code == 82 or code == 76:  # F G R L
+                x += seg_length * hx
+                y += seg_length * hy
+                coordinates[index, 0] = x
+                coordinates[index, 1] = y
+                index += 1
+            elif code == 43:  # + rotates clockwise
+                hx, hy = hx * ca + hy * sa, hy * ca - hx * sa
+                rotations += 1
+            elif code == 45:  # - rotates counterclockwise
+                hx, hy = hx * ca - hy * sa, hy * ca + hx * sa
+                rotations += 1
+            elif code == 91:  # [
+                stack[sp, 0] = x
+                stack[sp, 1] = y
+                stack[sp, 2] = hx
+                stack[sp, 3] = hy
+                sp += 1
+            elif code == 93:  # ]
+                sp -= 1
+                x = stack[sp, 0]
+                y = stack[sp, 1]
+                hx = stack[sp, 2]
+                hy = stack[sp, 3]
+                coordinates[index, 0] = x
+                coordinates[index, 1] = y
+                breaks[n_breaks] = index
+                n_breaks += 1
+                index += 1
+            if rotations >= 1024:
+                rotations = 0
+                norm = 1.0 / math.sqrt(hx * hx + hy * hy)
+                hx *= norm
+                hy *= norm
+        return index, n_breaks
+
+
+def derivation(axiom, steps, rules=None, max_len=None):
+    """Generates an L-System sequence for a given axiom and number of steps.
+
+    If max_len is given, raises ValueError before expanding anything whenever
+    the predicted final length exceeds it (the growth matrix makes the
+    prediction exact and essentially free).
+    """
+    if rules is None:
+        rules = SYSTEM_RULES
+    if steps <= 0:
+        return axiom
+    # Identity rules are no-ops, and if no remaining rule touches any axiom
+    # symbol the axiom is a fixed point: every pass would copy it unchanged.
+    rules = {key: value for key, value in rules.items() if value != key}
+    if not any(char in rules for char in set(axiom)):
+        return axiom
+    if max_len is not None:
+        projected = predicted_length(axiom, steps, rules)
+        if projected > max_len:
+            raise ValueError(
+                f"Derivation would produce {projected:,} symbols, over the {max_len:,} limit. "
+                "Try reducing iterations or simplifying the rules."
+            )
+    # L-system alphabets are ASCII in practice, so the rewrite runs on bytes:
+    # one byte per symbol instead of a PyUnicode object, with a flat 256-entry
+    # expansion table shared by the Python and compiled paths.
+    try:
+        buf = axiom.encode("ascii")
+        table = _rule_table(rules)
+    except UnicodeEncodeError:
+        derived = axiom  # non-ASCII symbols: plain dict-based rewrite
+        for _ in range(steps):
+            derived = ''.join(rules.get(char, char) for char in derived)
+        return derived
+    if all(len(expansion) == 1 for expansion in table):
+        # Every expansion is a single byte, so each pass is a bytes.translate
+        # — and because 1:1 passes compose, all steps collapse into one
+        # composed table applied once at C speed.
+        single = b"".join(table)
+        composed = single
+        for _ in range(steps - 1):
+            composed = composed.translate(single)
+        return buf.translate(composed).decode("ascii")
+    if _HAVE_NUMBA:
+        offsets, lengths, expansions = _flatten_table(table)
+        out = _derive_kernel(np.frombuffer(buf, dtype=np.uint8), offsets, lengths, expansions, steps)
+        return out.tobytes().decode("ascii")
+    # Each pass writes into an exactly-sized bytearray. Sizing comes free of
+    # string scans: the Parikh (per-byte count) vector is bincounted once
+    # from the axiom and then advanced through the byte-level growth matrix,
+    # a 256-vector matvec per pass regardless of sequence length.
+    length_by_byte = np.array([len(expansion) for expansion in table], dtype=np.int64)
+    growth = np.zeros((256, 256), dtype=np.int64)
+    for code, expansion in enumerate(table):
+        for produced in expansion:
+            growth[produced, code] += 1
+    counts = np.bincount(np.frombuffer(buf, dtype=np.uint8), minlength=256)
     for _ in range(steps):
-        derived = ''.join(SYSTEM_RULES.get(char, char) for char in derived)
-    return derived
+        out = bytearray(int(counts @ length_by_byte))
+        pos = 0
+        for code in buf:
+            expansion = table[code]
+            out[pos:pos + len(expansion)] = expansion
+            pos += len(expansion)
+        buf = bytes(out)
+        counts = growth @ counts
+    return buf.decode("ascii")
+
+
+# Cache of intermediate derivation levels keyed by (axiom, rules items):
+# entry i of each list is the i-step derivation, so raising the iteration
+# count only costs the extra rewrite passes beyond what is already stored.
+_DERIVATION_LEVELS = {}
+_DERIVATION_LEVELS_MAX = 32
+
+
+def derivation_cached(axiom, steps, rules=None):
+    """Memoized derivation for callers that repeat identical requests.
+
+    Every intermediate level is cached, so going from N to N+1 iterations of
+    the same system reuses the N-step string and performs a single rewrite
+    pass. The Streamlit app has its own st.cache_data layer; this serves
+    plain library/CLI use.
+    """
+    if rules is None:
+        rules = SYSTEM_RULES
+    key = (axiom, tuple(sorted(rules.items())))
+    if key not in _DERIVATION_LEVELS and len(_DERIVATION_LEVELS) >= _DERIVATION_LEVELS_MAX:
+        _DERIVATION_LEVELS.clear()
+    levels = _DERIVATION_LEVELS.setdefault(key, [axiom])
+    while len(levels) <= steps:
+        levels.append(derivation(levels[-1], 1, rules))
+    return levels[steps]
+
+
+def _int_matrix_power(matrix, exponent):
+    """Matrix power by squaring in exact Python-int arithmetic.
+
+    np.linalg.matrix_power works in int64 and wraps silently once counts pass
+    2**63 — and a wrapped prediction landing under a caller's max_len would
+    wave through exactly the runaway configurations the guard exists to stop.
+    The growth matrix is alphabet-sized, so object-dtype multiplies are free.
+    """
+    result = np.identity(len(matrix), dtype=object)
+    base = matrix.astype(object)
+    while exponent:
+        if exponent & 1:
+            result = result.dot(base)
+        exponent >>= 1
+        if exponent:
+            base = base.dot(base)
+    return result
+
+
+def predicted_counts(axiom, steps, rules=None):
+    """Predicts per-symbol counts after `steps` rewrites without deriving.
+
+    Symbol counts evolve linearly: counts_{n+1} = M @ counts_n, where M[i, j]
+    is how many of symbol i the rule for symbol j produces. A matrix power on
+    that (tiny) matrix gives the final counts in O(log steps) multiplies.
+    Returns a dict mapping each symbol to its count.
+    """
+    if rules is None:
+        rules = SYSTEM_RULES
+    alphabet = sorted(set(axiom) | set(rules) | {char for value in rules.values() for char in value})
+    index = {char: i for i, char in enumerate(alphabet)}
+    growth = np.zeros((len(alphabet), len(alphabet)), dtype=np.int64)
+    for j, symbol in enumerate(alphabet):
+        for char in rules.get(symbol, symbol):
+            growth[index[char], j] += 1
+    counts = np.zeros(len(alphabet), dtype=np.int64)
+    for char in axiom:
+        counts[index[char]] += 1
+    counts = _int_matrix_power(growth, steps).dot(counts)
+    return dict(zip(alphabet, counts.tolist()))
+
+
+def predicted_length(axiom, steps, rules=None):
+    """Predicts the derived sequence length without materializing it."""
+    return sum(predicted_counts(axiom, steps, rules).values())
+
+
+def iter_derivation(axiom, steps, rules=None):
+    """Yields the symbols of the derived sequence without materializing it.
+
+    The first steps-1 rewrites run normally; the final (largest) pass is
+    streamed symbol by symbol, so the full result string never has to exist
+    in memory. Useful for consumers that only need one pass, e.g. a fused
+    derive-and-walk over deep iterations.
+    """
+    if rules is None:
+        rules = SYSTEM_RULES
+    if steps <= 0:
+        yield from axiom
+        return
+    for char in derivation(axiom, steps - 1, rules):
+        yield from rules.get(char, char)
+
+
+class _StepTable(dict):
+    """Unit step vectors for each heading the turtle can reach.
+
+    Headings only ever change by +/- angle_increment, so they form the tiny
+    set initial_heading + k * angle_increment keyed by the integer turn count
+    k. Each distinct heading pays for its trig once; every later forward step
+    on it is a dict hit instead of two libm calls.
+    """
+
+    def __init__(self, initial_heading, angle_increment):
+        super().__init__()
+        self.initial_heading = initial_heading
+        self.angle_increment = angle_increment
+
+    def __missing__(self, turns):
+        angle = math.radians(self.initial_heading + turns * self.angle_increment)
+        step = (math.cos(angle), math.sin(angle))
+        self[turns] = step
+        return step
+
+
+def _compiled_walk(sequence, seg_length, initial_heading, angle_increment):
+    """Runs the bracketed walk through the compiled kernel.
+
+    Returns (coordinates, breaks), where breaks holds the index of each
+    bracket pop's restored point — the pen-up positions that split the walk
+    into polylines. Returns None for non-ASCII sequences, which fall back to
+    the interpreted loops.
+    """
+    try:
+        codes = np.frombuffer(sequence.encode("ascii"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return None
+    # The kernel pops without bounds checks, so an unmatched "]" would read
+    # uninitialized stack memory; reject it up front the way the interpreted
+    # loops' stack.pop() does.
+    depth = np.cumsum((codes == ord("[")).astype(np.int64) - (codes == ord("]")))
+    if depth.size and depth.min() < 0:
+        raise IndexError("unmatched ']' in L-system sequence")
+    n_points = 1 + sum(sequence.count(symbol) for symbol in "FGRL]")
+    coordinates = np.empty((n_points, 2), dtype=np.float32)
+    stack = np.empty((max(sequence.count("["), 1), 4), dtype=np.float64)
+    breaks = np.empty(max(sequence.count("]"), 1), dtype=np.int64)
+    index, n_breaks = _walk_kernel(codes, float(seg_length), float(initial_heading),
+                                   float(angle_increment), coordinates, stack, breaks)
+    return coordinates[:index], breaks[:n_breaks]
 
 
 def generate_coordinates(sequence, seg_length, initial_heading, angle_increment):
@@ -41,37 +357,190 @@ def generate_coordinates(sequence, seg_length, initial_heading, angle_increment)
         angle_increment (float): The angle increment for each rotation command.
 
     Returns:
-        list of tuples: Each tuple contains (x, y) coordinates for plotting.
+        np.ndarray: Array of shape (N, 2) with the (x, y) coordinates for plotting.
     """
+    # Fast path: without branch brackets the walk has no stack state, so the
+    # whole sequence can be interpreted with a handful of NumPy passes
+    # (heading = cumulative sum of turns, position = cumulative sum of steps).
+    if "[" not in sequence and "]" not in sequence:
+        try:
+            arr = np.frombuffer(sequence.encode("ascii"), dtype=np.uint8)
+        except UnicodeEncodeError:
+            pass  # non-ASCII symbols: use the stack-based loop below
+        else:
+            plus = arr == ord("+")
+            minus = arr == ord("-")
+            draw = np.isin(arr, np.frombuffer(b"FGRL", dtype=np.uint8))
+            # Only forward steps move the turtle, so mask the headings down to
+            # those positions before any trig or position cumsum: rotation
+            # symbols often make up half the sequence, and this keeps them out
+            # of every pass after the turn cumsum.
+            if float(initial_heading).is_integer() and float(angle_increment).is_integer():
+                turns = minus.astype(np.int64) - plus.astype(np.int64)
+                heading_deg = (int(initial_heading) + int(angle_increment) * np.cumsum(turns)) % 360
+                cos_h = _COS_DEG[heading_deg[draw]]
+                sin_h = _SIN_DEG[heading_deg[draw]]
+            else:
+                delta = np.where(plus, -float(angle_increment),
+                                 np.where(minus, float(angle_increment), 0.0))
+                heading = np.deg2rad(initial_heading + np.cumsum(delta))[draw]
+                cos_h = np.cos(heading)
+                sin_h = np.sin(heading)
+            xs = np.concatenate(([0.0], np.cumsum(seg_length * cos_h)))
+            ys = np.concatenate(([0.0], np.cumsum(seg_length * sin_h)))
+            # Accumulate in float64 for accuracy, hand back float32: screen
+            # rendering needs ~7 significant digits and half the bandwidth.
+            return np.column_stack([xs, ys]).astype(np.float32)
+
+    # Bracketed sequences carry stack state, so they can't use the cumsum
+    # path — but the same loop compiles cleanly.
+    if _HAVE_NUMBA:
+        walked = _compiled_walk(sequence, seg_length, initial_heading, angle_increment)
+        if walked is not None:
+            return walked[0]
+
+    # The point count is known up front (one per draw command and bracket
+    # pop, plus the origin), so write into a preallocated array instead of
+    # growing a list of tuples.
+    n_points = 1 + sum(sequence.count(symbol) for symbol in "FGRL]")
+    coordinates = np.empty((n_points, 2), dtype=np.float32)
+
+    step_for = _StepTable(initial_heading, angle_increment)
     x, y = 0, 0  # Starting position
-    heading = initial_heading  # Start with the initial heading
-    coordinates = [(x, y)]
+    turns = 0  # Net rotation count; the heading is derived from it
+    coordinates[0] = (x, y)
+    index = 1
     stack = []
 
     for command in sequence:
         if command in "FGRL":
             # Move forward in the current direction
-            x += seg_length * math.cos(math.radians(heading))
-            y += seg_length * math.sin(math.radians(heading))
-            coordinates.append((x, y))
+            dx, dy = step_for[turns]
+            x += seg_length * dx
+            y += seg_length * dy
+            coordinates[index] = (x, y)
+            index += 1
         elif command == "+":
-            heading -= angle_increment  # Rotate clockwise
+            turns -= 1  # Rotate clockwise
         elif command == "-":
-            heading += angle_increment  # Rotate counterclockwise
+            turns += 1  # Rotate counterclockwise
         elif command == "[":
-            stack.append((x, y, heading))
+            stack.append((x, y, turns))
         elif command == "]":
-            x, y, heading = stack.pop()
-            coordinates.append((x, y))
+            x, y, turns = stack.pop()
+            coordinates[index] = (x, y)
+            index += 1
+
+    return coordinates[:index]
+
+
+def generate_polylines(sequence, seg_length, initial_heading, angle_increment):
+    """Interprets the sequence into a list of contiguous drawn polylines.
 
-    return coordinates
+    A closing bracket jumps the turtle back to its saved position; that jump
+    is a pen-up move, so it ends the current polyline and starts a new one at
+    the popped point instead of drawing a teleport line through the plot.
+    Bracket-free sequences come back as a single vectorized polyline.
+    """
+    if "[" not in sequence and "]" not in sequence:
+        return [generate_coordinates(sequence, seg_length, initial_heading, angle_increment)]
+
+    # The compiled walker records where each bracket pop landed, so the
+    # polylines fall out of one np.split over its output — the interpreted
+    # loop below only serves non-ASCII symbols or a missing numba.
+    if _HAVE_NUMBA:
+        walked = _compiled_walk(sequence, seg_length, initial_heading, angle_increment)
+        if walked is not None:
+            coordinates, breaks = walked
+            return [piece for piece in np.split(coordinates, breaks) if len(piece) > 1]
+
+    step_for = _StepTable(initial_heading, angle_increment)
+    x, y = 0, 0
+    turns = 0
+    polylines = []
+    current = [(x, y)]
+    stack = []
+
+    # Rules like F->FF make the derived string full of runs of the same
+    # symbol; one loop iteration per run (a run of forwards is a single
+    # longer segment, a run of turns a single bigger rotation) instead of
+    # one per character.
+    for command, group in groupby(sequence):
+        count = sum(1 for _ in group)
+        if command in "FGRL":
+            dx, dy = step_for[turns]
+            x += seg_length * count * dx
+            y += seg_length * count * dy
+            current.append((x, y))
+        elif command == "+":
+            turns -= count
+        elif command == "-":
+            turns += count
+        elif command == "[":
+            for _ in range(count):
+                stack.append((x, y, turns))
+        elif command == "]":
+            for _ in range(count):
+                if len(current) > 1:
+                    polylines.append(np.asarray(current, dtype=np.float32))
+                x, y, turns = stack.pop()
+                current = [(x, y)]
+
+    if len(current) > 1:
+        polylines.append(np.asarray(current, dtype=np.float32))
+    return polylines
+
+
+def derive_and_walk(axiom, steps, seg_length, initial_heading, angle_increment, rules=None):
+    """Fuses the final rewrite pass with the coordinate walk.
+
+    Symbols stream from iter_derivation straight into the turtle update, so
+    the final (largest) derivation string is never materialized; the output
+    array is sized up front from predicted_counts. Per symbol this is slower
+    than derivation + the vectorized generate_coordinates, so it's the right
+    tool when peak memory rather than time is the constraint.
+    """
+    if rules is None:
+        rules = SYSTEM_RULES
+    counts = predicted_counts(axiom, steps, rules)
+    n_points = 1 + sum(counts.get(symbol, 0) for symbol in "FGRL]")
+    coordinates = np.empty((n_points, 2), dtype=np.float32)
+    step_for = _StepTable(initial_heading, angle_increment)
+    x, y = 0, 0
+    turns = 0
+    coordinates[0] = (x, y)
+    index = 1
+    stack = []
+
+    for command in iter_derivation(axiom, steps, rules):
+        if command in "FGRL":
+            dx, dy = step_for[turns]
+            x += seg_length * dx
+            y += seg_length * dy
+            coordinates[index] = (x, y)
+            index += 1
+        elif command == "+":
+            turns -= 1
+        elif command == "-":
+            turns += 1
+        elif command == "[":
+            stack.append((x, y, turns))
+        elif command == "]":
+            x, y, turns = stack.pop()
+            coordinates[index] = (x, y)
+            index += 1
+
+    return coordinates[:index]
 
 
 def plot_l_system(coordinates):
     """Plots the L-System based on generated coordinates."""
+    import matplotlib.pyplot as plt
+
+    coords = np.asarray(coordinates)
     plt.figure(figsize=(8, 8))
-    plt.plot(*zip(*coordinates), lw=0.5)
-    plt.axis("equal")
+    plt.plot(coords[:, 0], coords[:, 1], lw=0.5)
+    plt.gca().set_aspect("equal")
     plt.axis("off")
     plt.show()
 